@@ -20,13 +20,16 @@
 # Thanks to jupytext, this notebook can be imported as `import common_functions` or `from common_functions import *`.
 
 # %%
+import html
 import lzma
 import os.path
 import typing as t
 from glob import glob
 from itertools import cycle
+from multiprocessing import Pool
 
 import matplotlib.cm
+import numpy as np
 import pylib
 import tabulate
 from IPython.display import HTML, display
@@ -44,14 +47,38 @@ def show_infos_for_domain(domain: str) -> None:
         "/mnt/data/Downloads/dnscaptures-large-again/dnscaptures/working/processed"
     )
 
-    table = [
-        [repr(seq), seq.classify()]
-        for seq in map(
-            pylib.load_file, glob(os.path.join(basefolder, domain, "*-*-0.dnstap*"))
-        )
-    ]
+    files = glob(os.path.join(basefolder, domain, "*-*-0.dnstap*"))
+    with Pool() as pool:
+        table = pool.map(_sequence_info, files)
 
-    display(HTML(tabulate.tabulate(table, tablefmt="html")))
+    display(HTML(html_table(table)))
+
+
+def html_table(table: t.List[t.List[t.Any]]) -> str:
+    """
+    Format the rows of `table` as an HTML table
+
+    `tabulate` becomes slow for many rows, as it first determines the column widths.
+    HTML does not need aligned columns, so large tables are formatted directly.
+    """
+    if len(table) <= 200:
+        return tabulate.tabulate(table, tablefmt="html")
+
+    rows = (
+        "<tr>" + "".join(f"<td>{html.escape(str(cell))}</td>" for cell in row) + "</tr>"
+        for row in table
+    )
+    return "<table>\n<tbody>\n" + "\n".join(rows) + "\n</tbody>\n</table>"
+
+
+def _sequence_info(file: str) -> t.List[t.Any]:
+    """
+    Load a single sequence file and return a table row for `show_infos_for_domain`
+
+    This runs in a worker process, so only the row and not the `Sequence` is sent back.
+    """
+    seq = pylib.load_file(file)
+    return [repr(seq), seq.classify()]
 
 
 # %%
@@ -68,30 +95,27 @@ def autolabel(
     yoffset: Allows moving the text on the y-axis by a fixed amount
     The value must be a scalar, applying the same offset to all bars, or a list with one entry per bar
     """
-    yoffsets: t.List = []
-
-    if yoffset is None:
-        yoffsets = [0] * len(rects)
-    elif isinstance(yoffset, float):
-        yoffsets = [yoffset] * len(rects)
-    elif isinstance(yoffset, list):
-        assert len(rects) == len(yoffset)
-        yoffsets = yoffset
-    else:
-        raise Exception(
-            "Unkown type for `yoffsets`, needs to be scalar or list of scalar."
-        )
-
-    for rect, offset in zip(rects, yoffsets):
-        height = rect.get_height() + rect.get_y()
-        plt.text(
-            rect.get_x() + rect.get_width() / 2.0,
-            height + 0.5 + offset,
-            f"{height:.{precision}f}",
-            ha="center",
-            va="bottom",
-            rotation=0,
-        )
+    if len(rects) == 0:
+        return
+
+    # Collect the geometry of all bars at once, instead of querying each bar individually
+    geometry = np.array(
+        [
+            (rect.get_x(), rect.get_y(), rect.get_width(), rect.get_height())
+            for rect in rects
+        ]
+    )
+    xs = geometry[:, 0] + geometry[:, 2] / 2.0
+    heights = geometry[:, 1] + geometry[:, 3]
+    # Scalars apply to all bars, lists need one entry per bar
+    yoffsets = np.broadcast_to(
+        np.asarray(0.0 if yoffset is None else yoffset, dtype=float), heights.shape
+    )
+    ys = heights + 0.5 + yoffsets
+    texts = np.char.mod(f"%.{precision}f", heights)
+
+    for x, y, text in zip(xs, ys, texts):
+        plt.text(x, y, text, ha="center", va="bottom", rotation=0)
 
 
 # %%
@@ -1,9 +1,7 @@
 #!/usr/bin/env python3
 # pylint: disable=redefined-outer-name
-import json
 import sys
 import typing as t
-from datetime import datetime
 
 import matplotlib
 import matplotlib.pyplot as plt
@@ -11,6 +9,12 @@ import numpy as np
 from matplotlib.colors import ListedColormap
 from matplotlib.lines import Line2D
 
+try:
+    # orjson parses large query dumps much faster, but it is an optional dependency
+    from orjson import loads as json_loads
+except ImportError:
+    from json import loads as json_loads
+
 if "queries" not in dir():
     queries: str = "[]"
 if "image_width" not in dir():
@@ -25,13 +29,13 @@ if "output_filename" not in dir():
 plt.clf()
 
 
-def parse_date(date: str) -> datetime:
+def parse_dates(dates: t.List[str]) -> np.ndarray:
     """
-    Convert an ISO8601 string from chrono into a datetime object
+    Convert a list of ISO8601 strings from chrono into an array of `datetime64[ns]`
     """
 
-    # See bug: https://bugs.python.org/issue35829
-    return datetime.fromisoformat(date.replace("Z", "+00:00"))
+    # All timestamps are in UTC, but numpy does not accept the "Z" suffix
+    return np.char.rstrip(np.array(dates, dtype=str), "Z").astype("datetime64[ns]")
 
 
 def categorical_cmap(
@@ -44,74 +48,78 @@ def categorical_cmap(
         ccolors = plt.get_cmap(cmap)(np.linspace(0, 1, num_colors))
     else:
         ccolors = plt.get_cmap(cmap)(np.arange(num_colors, dtype=int))
-    cols = np.zeros((num_colors * colors_steps, 3))
-    for i, c in enumerate(ccolors):
-        chsv = matplotlib.colors.rgb_to_hsv(c[:3])
-        arhsv = np.tile(chsv, colors_steps).reshape(colors_steps, 3)
-        arhsv[:, 1] = np.linspace(chsv[1], 0.25, colors_steps)
-        arhsv[:, 2] = np.linspace(chsv[2], 1, colors_steps)
-        rgb = matplotlib.colors.hsv_to_rgb(arhsv)
-        cols[i * colors_steps : (i + 1) * colors_steps, :] = rgb
+    chsv = matplotlib.colors.rgb_to_hsv(ccolors[:, :3])
+    # Each base color is expanded into `colors_steps` consecutive rows, which fade out towards
+    # a lower saturation and higher value
+    arhsv = np.repeat(chsv, colors_steps, axis=0)
+    arhsv[:, 1] = np.linspace(chsv[:, 1], 0.25, colors_steps, axis=1).ravel()
+    arhsv[:, 2] = np.linspace(chsv[:, 2], 1, colors_steps, axis=1).ravel()
+    cols = matplotlib.colors.hsv_to_rgb(arhsv)
     cmap = ListedColormap(cols)
     return cmap
 
 
 def info_from_source(
-    colormap: ListedColormap, source: str, response_size: int, queryset_id: int
-) -> t.Tuple[str, float, float, t.Optional[str]]:
+    forwarder_colors: np.ndarray,
+    sources: np.ndarray,
+    response_sizes: np.ndarray,
+    queryset_id: int,
+) -> t.Tuple[np.ndarray, np.ndarray, np.ndarray]:
     """
     Return some plotting parameters based on the query source and response size.
+
+    `forwarder_colors` contains the RGBA colors indexed by the number of blocks and
+    queryset, as returned by `forwarder_colors_from_colormap`.
+    Returns the colors (as RGBA), heights, and alphas, with one entry per query.
     """
-    height = None
-    color = None
-    alpha = None
-    hatch = None
-    colorcount = len(colormap.colors) // 4
-    if source == "Forwarder":
-        height = 1.0
-        alpha = 1.0
-        if response_size <= 1 * 468:
-            # red
-            color = colormap.colors[colorcount * 0 + queryset_id]
-        elif response_size <= 2 * 468:
-            # yellow
-            color = colormap.colors[colorcount * 1 + queryset_id]
-        elif response_size <= 3 * 468:
-            # magenta
-            color = colormap.colors[colorcount * 2 + queryset_id]
-        elif response_size <= 4 * 468:
-            # blue
-            color = colormap.colors[colorcount * 3 + queryset_id]
-        else:
-            # black
-            color = "k"
-    elif source == "Client":
-        height = 0.5
-        color = "g"
-        alpha = 0.33
-    else:
-        height = 0.33
-        color = "crimson"
-        alpha = 0.5
+    # Forwarder responses are colored by the number of 468 byte blocks they need
+    # red, yellow, magenta, blue, and black for anything larger than four blocks
+    colors_per_block = np.vstack(
+        [forwarder_colors[:, queryset_id], matplotlib.colors.to_rgba("k")]
+    )
+    blocks = np.searchsorted(468 * np.arange(1, 5), response_sizes)
+
+    is_forwarder = sources == "Forwarder"
+    is_client = sources == "Client"
+    colors = np.where(
+        is_forwarder[:, np.newaxis],
+        colors_per_block[blocks],
+        np.where(
+            is_client[:, np.newaxis],
+            matplotlib.colors.to_rgba("g"),
+            matplotlib.colors.to_rgba("crimson"),
+        ),
+    )
+    heights = np.where(is_forwarder, 1.0, np.where(is_client, 0.5, 0.33))
+    alphas = np.where(is_forwarder, 1.0, np.where(is_client, 0.33, 0.5))
 
-    return (color, height, alpha, hatch)
+    return (colors, heights, alphas)
 
 
-LABEL2INDEX: t.Dict[str, int] = dict()
+def forwarder_colors_from_colormap(colormap: ListedColormap) -> np.ndarray:
+    """
+    Convert the colors of a `categorical_cmap` with four categories into a lookup table
 
-# Only for use by `get_next_index`
-NEXT_INDEX = -1
+    The returned array is indexed by the number of blocks minus one, the queryset, and
+    the RGBA channel.
+    """
+    return matplotlib.colors.to_rgba_array(colormap.colors).reshape(4, -1, 4)
 
 
-def get_next_index() -> int:
+def factorize(values: t.List[str]) -> t.Tuple[np.ndarray, np.ndarray]:
     """
-    Return an index to use as axis argument for matplotlib
+    Assign each distinct value an integer code, in the order of their first occurrence
+
+    Returns the codes for all values and the distinct values ordered by their code.
     """
 
-    global NEXT_INDEX  # pylint: disable=global-statement
-    tmp = NEXT_INDEX
-    NEXT_INDEX -= 1
-    return tmp
+    uniques, first_index, inverse = np.unique(
+        values, return_index=True, return_inverse=True
+    )
+    order = np.argsort(first_index)
+    codes = np.empty_like(order)
+    codes[order] = np.arange(len(order))
+    return (codes[inverse.ravel()], uniques[order])
 
 
 # class Query(t.TypedDict):
@@ -124,12 +132,13 @@ def get_next_index() -> int:
 #     response_size: int
 
 
-parsed_queries: t.List[t.List[t.Any]] = json.loads(queries)
+parsed_queries: t.List[t.List[t.Any]] = json_loads(queries)
 if len(parsed_queries) == 0:
     sys.exit(1)
 
 num_querysets = len(parsed_queries)
 colormap = categorical_cmap(4, num_querysets)
+forwarder_colors = forwarder_colors_from_colormap(colormap)
 
 correction_factor = 1.0
 if num_querysets == 4:
@@ -143,59 +152,70 @@ if num_querysets > 1:
 
 end_time = 0.0
 
-for queryset_id, (queryset, filename) in enumerate(parsed_queries):
-    # A queryset is the set of queries from a single source file
-    # Multiple sourcefiles can be combined into one output plot
-    for q in queryset:
-        q["start"] = parse_date(q["start"])
-        q["end"] = parse_date(q["end"])
+# A queryset is the set of queries from a single source file
+# Multiple sourcefiles can be combined into one output plot
+# Each entry contains the queries sorted by start time and the start and end times in
+# seconds relative to the first query
+prepared_querysets: t.List[t.Tuple[t.List[t.Any], np.ndarray, np.ndarray]] = []
+for queryset, _filename in parsed_queries:
+    starts = parse_dates([q["start"] for q in queryset])
+    ends = parse_dates([q["end"] for q in queryset])
 
     # Sort by start time
-    queryset.sort(key=lambda x: x["start"])
-
-    min_dns_start = queryset[0]["start"]
-    prev_end = None
-
-    for i, q in enumerate(queryset):
-        end_time = max(end_time, (q["end"] - min_dns_start).total_seconds())
-
-        label = f"{q['qname']} ({q['qtype']})"
-
-        if label not in LABEL2INDEX.keys():
-            LABEL2INDEX[label] = get_next_index()
-        ind = LABEL2INDEX[label]
-
-        # The ind only contains which qname/qtype pair we have
-        # Since we can have multiple querysets we want them to be plotted under each other
-        # So set 0 on the top, set 1 afterwards, and only then we want to plot ind=1
-        # This scales ind to do the right thing
-        ind = ind * num_querysets - queryset_id
-
-        start = q["start"]
-        end = q["end"]
-        color, height, alpha, hatch = info_from_source(
-            colormap, q["source"], q["response_size"], queryset_id
-        )
+    order = np.argsort(starts, kind="stable")
+    queryset = [queryset[i] for i in order]
+
+    min_dns_start = starts[order[0]]
+    starts = (starts[order] - min_dns_start) / np.timedelta64(1, "s")
+    ends = (ends[order] - min_dns_start) / np.timedelta64(1, "s")
+    end_time = max(end_time, float(ends.max()))
+    prepared_querysets.append((queryset, starts, ends))
+
+# Assign every qname/qtype pair an index to use as axis argument for matplotlib
+# The first pair gets -1, the next one -2, etc.
+label_codes, unique_labels = factorize(
+    [
+        f"{q['qname']} ({q['qtype']})"
+        for queryset, _starts, _ends in prepared_querysets
+        for q in queryset
+    ]
+)
+LABEL2INDEX: t.Dict[str, int] = {
+    label: -code - 1 for code, label in enumerate(unique_labels)
+}
+label_codes_per_queryset = np.split(
+    label_codes,
+    np.cumsum([len(queryset) for queryset, _starts, _ends in prepared_querysets])[:-1],
+)
 
-        plt.barh(
-            ind,
-            (end - start).total_seconds(),
-            left=(start - min_dns_start).total_seconds() / correction_factor,
-            color=color,
-            alpha=alpha,
-            height=height,
-            hatch=hatch,
-        )
+for queryset_id, ((queryset, starts, ends), codes) in enumerate(
+    zip(prepared_querysets, label_codes_per_queryset)
+):
+    durations = ends - starts
+
+    # The index only contains which qname/qtype pair we have
+    # Since we can have multiple querysets we want them to be plotted under each other
+    # So set 0 on the top, set 1 afterwards, and only then we want to plot ind=1
+    # This scales ind to do the right thing
+    inds = (-codes - 1) * num_querysets - queryset_id
+
+    colors, heights, alphas = info_from_source(
+        forwarder_colors,
+        np.array([q["source"] for q in queryset]),
+        np.array([q["response_size"] for q in queryset]),
+        queryset_id,
+    )
 
-        if num_querysets == 1:
-            # Only attach labels, if we print a single queryset
-            label = ""
-            if prev_end:
-                label += f" 𝚫 {round((end-prev_end).total_seconds() * 1000, 3)} ms "
-            prev_end = end
-            label += f"\n⏱ {round((end-start).total_seconds() * 1000, 3)} ms"
+    if num_querysets == 1:
+        # Only attach labels, if we print a single queryset
+        # Gap to the previous query and duration of each query in milliseconds
+        deltas_ms = np.round(np.diff(ends) * 1000, 3)
+        durations_ms = np.round(durations * 1000, 3)
+        for i, (end, duration_ms, ind) in enumerate(zip(ends, durations_ms, inds)):
+            delta = f" 𝚫 {deltas_ms[i - 1]} ms " if i > 0 else ""
+            label = f"{delta}\n⏱ {duration_ms} ms"
             plt.text(
-                (end - min_dns_start).total_seconds(),
+                end,
                 ind,
                 label,
                 horizontalalignment="left",
@@ -203,11 +223,24 @@ for queryset_id, (queryset, filename) in enumerate(parsed_queries):
                 fontname="Symbola",
             )
 
+    # Bars which share the same alpha can be drawn with a single `barh` call
+    for alpha in np.unique(alphas):
+        mask = alphas == alpha
+        plt.barh(
+            inds[mask],
+            durations[mask],
+            left=starts[mask] / correction_factor,
+            color=colors[mask],
+            alpha=alpha,
+            height=heights[mask],
+        )
+
 legend_handles = [
     Line2D(
         [0],
         [0],
-        color=info_from_source(colormap, "Forwarder", 128, queryset_id)[0],
+        # Color of a Forwarder response fitting into a single block
+        color=forwarder_colors[0, queryset_id],
         lw=8,
         label=filename,
     )
@@ -11,12 +11,23 @@ elif pylib_force_debug == "0" or pylib_force_debug == "false":
 else:
     force_debug = None
 
+# Optimize for the CPU of the build machine.
+# This makes the extension non-portable, so it is opt-in.
+pylib_native = os.getenv("PYLIB_NATIVE", "").lower()
+native = pylib_native == "1" or pylib_native == "true"
+
 
 setup(
     name="pylib",
     version="1.1.0",
     rust_extensions=[
-        RustExtension("pylib", "Cargo.toml", binding=Binding.PyO3, debug=force_debug)
+        RustExtension(
+            "pylib",
+            "Cargo.toml",
+            binding=Binding.PyO3,
+            debug=force_debug,
+            native=native,
+        )
     ],
     # rust extensions are not zip safe, just like C-extensions.
     zip_safe=False,
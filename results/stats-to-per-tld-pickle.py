@@ -1,53 +1,67 @@
 #!/usr/bin/env python3
 
-import csv
+import functools
 import pickle
 import sys
 import typing as t
 from pathlib import Path
 
+import pandas as pd
 from tldextract import extract
 
 # Type definitions
 KeyType = t.Tuple[int, str]
 CountsType = t.List[int]
-AggType = t.Dict[KeyType, CountsType]
 ResType = t.List[t.Tuple[KeyType, CountsType]]
 
+# Columns of the CSV file which are summed up per key
+COUNT_COLUMNS = [
+    "corr",
+    "corr_w_reason",
+    "und",
+    "und_w_reason",
+    "wrong",
+    "wrong_w_reason",
+]
+
+
+@functools.lru_cache(maxsize=None)
+def public_suffix(label: str) -> str:
+    # The same labels occur once per k value, so caching avoids repeating the lookup
+    return extract(label).suffix
+
 
 def main(file: Path) -> None:
-    reader = csv.DictReader(file.open())
-    # skip header row
-    next(reader)
-
-    aggregate: AggType = dict()
-    for row in reader:
-        key = (int(row["k"]), extract(row["label"]).suffix)
-        res = aggregate.get(key, [0, 0, 0, 0, 0, 0, 0])
-        res[0] += int(row["corr"])
-        res[1] += int(row["corr_w_reason"])
-        res[2] += int(row["und"])
-        res[3] += int(row["und_w_reason"])
-        res[4] += int(row["wrong"])
-        res[5] += int(row["wrong_w_reason"])
-        res[6] += 10
-        aggregate[key] = res
+    # skip the row after the header row
+    # The labels are domain names and must never be interpreted as NaN
+    rows = pd.read_csv(file, skiprows=[1], dtype={"label": str}, keep_default_na=False)
+    rows["suffix"] = rows["label"].map(public_suffix)
+
+    groups = rows.groupby(["k", "suffix"])
+    aggregate = groups[COUNT_COLUMNS].sum()
+    # Every row accounts for 10 classification results
+    aggregate["total"] = groups.size() * 10
 
     # The shape is as follows
-    # {
-    #     (k, TLD): [corr, corr_w_reason, und, und_w_reason, wrong, wrong_w_reason, total],
+    # index (k, TLD), columns [corr, corr_w_reason, und, und_w_reason, wrong, wrong_w_reason, total]
     #
-    #     # types:
-    #     (int, str): [int, int, int, int, int, int, int],
-    #     ...
-    # }
+    # types:
+    # index (int, str), columns [int, int, int, int, int, int, int]
+
+    # filter TLDs with many domains
+    # This happens before sorting, such that only the remaining TLDs need to be sorted
+    aggregate = aggregate[aggregate["total"] > 300]
 
     # convert to list
-    results: ResType = list(aggregate.items())
+    results: ResType = [
+        ((int(k), suffix), counts)
+        for (k, suffix), counts in zip(
+            aggregate.index.tolist(), aggregate.to_numpy().tolist()
+        )
+    ]
     # sort by TLD
+    # The key is computed only once per element by `sort`
     results.sort(key=lambda x: tuple(reversed(x[0][1].split("."))))
-    # filter TLDs with many domains
-    results = [x for x in results if x[1][6] > 300]
 
     # The shape is as follows
     # [
@@ -82,7 +96,8 @@ def main(file: Path) -> None:
                 "xticks": [x[0][1] for x in data],
             },
         )
-        pickle.dump(to_pickle, file.parent.joinpath(f"per-tld.k{k}.pickle").open("wb"))
+        with file.parent.joinpath(f"per-tld.k{k}.pickle").open("wb") as fp:
+            pickle.dump(to_pickle, fp, protocol=pickle.HIGHEST_PROTOCOL)
 
 
 if __name__ == "__main__":
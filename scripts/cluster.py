@@ -1,18 +1,40 @@
 #!/usr/bin/env python3
+import multiprocessing as mp
 import os
 import sys
 import typing as t
 from glob import glob
+from itertools import chain
 
+import numpy as np
 import pylib
 import scipy.cluster.hierarchy as cluster
 from matplotlib import pyplot as plt
 from natsort import natsorted
-from scipy.spatial.distance import pdist
 
+# The sorted sequences and their lengths
+# They are loaded before the pool is created, such that the workers inherit them by fork
+WORKER_SEQUENCES: t.List[pylib.Sequence] = []
+WORKER_LENGTHS: t.List[int] = []
 
-def labels(sequences: t.List[pylib.Sequence]) -> t.List[str]:
-    return [os.path.basename(seq.id()).replace(".dnstap.xz", "") for seq in sequences]
+
+def labels(files: t.List[str]) -> t.List[str]:
+    return [os.path.basename(file).replace(".dnstap.xz", "") for file in files]
+
+
+def distances_for_row(i: int) -> t.List[float]:
+    """
+    Return the normalized distances between sequence `i` and all later sequences.
+
+    Concatenating the rows in order yields the condensed distance matrix as returned by
+    `pdist`.
+    """
+    s1 = WORKER_SEQUENCES[i]
+    len1 = WORKER_LENGTHS[i]
+    return [
+        s1.distance(s2) / max(len1, len2)
+        for s2, len2 in zip(WORKER_SEQUENCES[i + 1 :], WORKER_LENGTHS[i + 1 :])
+    ]
 
 
 def help(pgrm: str) -> None:
@@ -26,23 +48,27 @@ def help(pgrm: str) -> None:
 
 
 def main() -> None:
+    global WORKER_SEQUENCES, WORKER_LENGTHS  # pylint: disable=global-statement
     if len(sys.argv) < 2:
         help(sys.argv[0])
 
     files: t.List[str] = []
     for arg in sys.argv[1:]:
         files += glob(arg)
-    sequences = natsorted(
-        (pylib.load_file(file) for file in files), key=lambda seq: seq.id()
-    )
+    # The id of a loaded sequence is the path of its file, so sort by the paths directly
+    files = natsorted(files)
+    leaf_labels = labels(files)
+    WORKER_SEQUENCES = [pylib.load_file(file) for file in files]
+    WORKER_LENGTHS = [seq.len() for seq in WORKER_SEQUENCES]
 
-    # pdist requires a 2-dimensional array, without any good reason
-    # So convert the list into an list of 1-element lists to fullfill this requirement
-    # The comparison lambda just has to take the 0th element every time
-    sequences_matrix = [[s] for s in sequences]
-    distances_pairwise = pdist(
-        sequences_matrix, lambda a, b: a[0].distance(b[0]) / max(a[0].len(), b[0].len())
-    )
+    # The pairwise distances are independent of each other, so compute them in parallel
+    # Each task computes one row of the upper triangle of the distance matrix
+    # Forked workers share the loaded sequences, nothing is pickled or parsed again
+    with mp.get_context("fork").Pool() as pool:
+        distances_pairwise = np.fromiter(
+            chain.from_iterable(pool.imap(distances_for_row, range(len(files)))),
+            dtype=float,
+        )
 
     for (threshold, method) in [
         (2000, "single"),
@@ -58,7 +84,7 @@ def main() -> None:
             Z,
             color_threshold=threshold,
             distance_sort="ascending",
-            labels=labels(sequences),
+            labels=leaf_labels,
             orientation="right",
             show_contracted=True,
             show_leaf_counts=True,
@@ -2,7 +2,6 @@
 
 import typing as t
 from collections import OrderedDict
-from copy import copy
 from itertools import cycle
 from pathlib import Path
 
@@ -29,7 +28,9 @@ if "__file__" in globals():
     import pickle
     import sys
 
-    rawdata, config = pickle.load(open(sys.argv[1], "rb"))
+    # Unpickling from memory avoids many small reads on the file
+    with open(sys.argv[1], "rb") as f:
+        rawdata, config = pickle.loads(f.read())
     rawimgpath = sys.argv[1] + ".svg"
 
 imgpath = Path(rawimgpath)
@@ -45,6 +46,8 @@ data = pd.DataFrame(plotdata)
 global data_perc  # pylint: disable=W0604
 # We need to transform the data from raw data to percentage (fraction)
 data_perc = data.divide(data.sum(axis=1), axis=0)
+# Plain NumPy array with one column per label, in the same order as `plotdata`
+perc = data_perc.to_numpy()
 
 # # Make the plot
 # # This plot uses filled lines, where each entry is only a single point, thus the curves are
@@ -67,22 +70,16 @@ if "colors" in config:
 else:
     colors = cycle([None])
 size = len(next(iter(plotdata.values())))
-line = np.zeros(size)
+xs = np.arange(1, size + 1)
+# Row i contains the lower boundary of the i-th label and the upper boundary of the (i-1)-th
+lines = np.vstack([np.zeros(size), np.cumsum(perc, axis=1).T])
 # for (label, color) in reversed(list(zip(plotdata.keys(), colors))):
-for (label, color) in zip(plotdata.keys(), colors):
+for i, (label, color) in enumerate(zip(plotdata.keys(), colors)):
     if color:
         kwargs["color"] = color
 
-    before = copy(line)
-    line += data_perc[label]
     plt.fill_between(
-        range(1, size + 1),
-        line,
-        before,
-        step="post",
-        label=label,
-        linewidth=0,
-        **kwargs
+        xs, lines[i + 1], lines[i], step="post", label=label, linewidth=0, **kwargs
     )
 
 fig = plt.gcf()
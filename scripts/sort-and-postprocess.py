@@ -7,6 +7,7 @@ import re
 import subprocess
 import sys
 import typing as t
+from concurrent.futures import ThreadPoolExecutor
 from glob import glob
 from os import path
 from shutil import copy2 as copy_file
@@ -32,8 +33,9 @@ def copy_files_hierarchical(files: t.List[str], to_path: str) -> t.List[str]:
     The files will be copied under `to_path`, based on the `RE_FILENAMES` regex above.
     The new path will be `to_path/<set>/<domain>/<basename>`.
     """
-    pool = mp.Pool()
-    return pool.starmap(copy_single_file, map(lambda x: (x, to_path), files))
+    # Copying is I/O bound, so threads suffice and avoid pickling every path to a worker
+    with ThreadPoolExecutor(max_workers=min(32, (os.cpu_count() or 1) * 4)) as executor:
+        return list(executor.map(lambda file: copy_single_file(file, to_path), files))
 
 
 def copy_single_file(file: str, to_path: str) -> str:
@@ -55,12 +57,13 @@ def postprocess_pcaps(files: t.List[str]) -> None:
     # Inner lists are at most `elements_per_batch` long
     elements_per_batch = 50
     batches = [
-        files[i * elements_per_batch : (i + 1) * elements_per_batch]
-        for i in range(len(files) // elements_per_batch + 1)
+        files[i : i + elements_per_batch]
+        for i in range(0, len(files), elements_per_batch)
     ]
 
-    pool = mp.Pool()
-    pool.map(postprocess_pcap_batch, batches)
+    with mp.Pool() as pool:
+        for _ in pool.imap_unordered(postprocess_pcap_batch, batches):
+            pass
 
 
 def postprocess_pcap_batch(batch: t.List[str]) -> None:
@@ -71,18 +74,23 @@ def postprocess_pcap_batch(batch: t.List[str]) -> None:
         os.remove(file)
 
 
-def concat_xz_files(files: t.List[str]) -> str:
+def concat_xz_files(files: t.List[str]) -> bytes:
     """
     Read a bunch of xz-files and concatenate them.
+
+    The files are decompressed in parallel.
     """
-    contents = []
-    for file in files:
-        with lzma.open(file, "rt") as f:
-            contents.append(f"# {file}")
-            contents.append(f.read())
-            contents.append("")
+    with mp.Pool() as pool:
+        contents = pool.map(decompress_xz_file, files)
+    return b"\n".join(contents)
+
 
-    return "\n".join(contents)
+def decompress_xz_file(file: str) -> bytes:
+    """
+    Decompress a single file and prefix it with a comment containing the filename
+    """
+    with lzma.open(file, "rb") as f:
+        return b"# " + file.encode() + b"\n" + f.read() + b"\n"
 
 
 def main() -> None:
@@ -102,7 +110,7 @@ def main() -> None:
     # Create one big tlskeys file for all keys
     print("Concatenate tlskeys files")
     tlskeys = concat_xz_files(glob(path.join(from_path, "*", "*.tlskeys.txt.xz")))
-    with open(path.join(to_path, "tlskeys.txt"), "w+t") as f:
+    with open(path.join(to_path, "tlskeys.txt"), "wb") as f:
         f.write(tlskeys)
 
     # Postprocess pcaps
@@ -1,7 +1,8 @@
 #!/usr/bin/env python3
 
 import csv
-import shlex
+import lzma
+import multiprocessing as mp
 import subprocess
 import sys
 import typing as t
@@ -74,6 +75,26 @@ def get_label(filename: str, canonicalizer: Canonicalize) -> str:
     return canonicalizer.canonicalize(label)
 
 
+def load_dns_requests(file: str) -> t.List[str]:
+    """
+    Return the query name, class, and type of all forwarder responses in a dnstap file
+    """
+    with lzma.open(file, "rb") as f:
+        res = subprocess.run(
+            ["dnstap-ldns", "-r", "-"],
+            input=f.read(),
+            stdout=subprocess.PIPE,
+            check=True,
+        )
+    # Only keep the forwarder responses (column 3) and the query name, class, and
+    # type (columns 7-9)
+    return [
+        " ".join(row[6:9])
+        for row in csv.reader(res.stdout.decode("utf-8").splitlines(), delimiter=" ")
+        if len(row) > 2 and row[2] == "FR"
+    ]
+
+
 def main() -> None:
     # Load a list of files to ignore
     # Load all the confusion domain information
@@ -85,33 +106,32 @@ def main() -> None:
     # the dict key is the label, then a list of traces and each trace is a list of requests
     loaded_domains: t.Dict[str, t.List[t.List[str]]] = dict()
 
-    for file in sorted(
-        glob(
-            "/mnt/data/Downloads/new-task-setup/2018-10-01-no-dnssec/processed/*/*.dnstap.*"
-        )
-    ):
-        if sanitize_file_name(file) in files_to_ignore:
-            continue
-        label = get_label(file, canonicalizer)
-
-        res = subprocess.run(
-            [
-                "fish",
-                "-c",
-                f"xzcat {shlex.quote(file)} | dnstap-ldns -r - | xsv search --delimiter ' ' --select 3 --no-headers 'FR' | xsv select 7-9",
-            ],
-            stdout=subprocess.PIPE,
-            check=True,
+    files = [
+        file
+        for file in sorted(
+            glob(
+                "/mnt/data/Downloads/new-task-setup/2018-10-01-no-dnssec/processed/*/*.dnstap.*"
+            )
         )
-        dns_reqs = [
-            sys.intern(req.replace(",", " "))
-            for req in res.stdout.decode("utf-8").splitlines()
-        ]
-        loaded_domains.setdefault(label, []).append(dns_reqs)
+        if sanitize_file_name(file) not in files_to_ignore
+    ]
+    # The files are independent of each other, so parse them in parallel
+    # `imap` keeps the order of the files, such that the traces are numbered as before
+    with mp.Pool() as pool:
+        for file, dns_reqs in zip(
+            files, pool.imap(load_dns_requests, files, chunksize=16)
+        ):
+            label = get_label(file, canonicalizer)
+            # Strings are not interned anymore after being sent from the worker process
+            dns_reqs = [sys.intern(req) for req in dns_reqs]
+            loaded_domains.setdefault(label, []).append(dns_reqs)
 
     # per domain count in how many labels it appears and in how many traces
     # the first value in the tuple is per label, the second is per trace
-    usage_per_domain: t.Dict[str, t.Tuple[t.Set[str], t.Set[str]]] = dict()
+    # traces are identified by the label and their index in the list of traces
+    usage_per_domain: t.Dict[
+        str, t.Tuple[t.Set[str], t.Set[t.Tuple[str, int]]]
+    ] = dict()
     for label, traces in loaded_domains.items():
         for trace_num, trace in enumerate(traces):
             for domain in trace:
@@ -119,7 +139,7 @@ def main() -> None:
                     domain, (set(), set())
                 )
                 label_set.add(label)
-                trace_set.add(f"{label}-{trace_num}")
+                trace_set.add((label, trace_num))
 
     counts_per_domain: t.Dict[str, t.Tuple[int, int]] = {
         domain: (len(labels), len(traces))
@@ -127,15 +147,20 @@ def main() -> None:
     }
 
     # for each trace count how many labels have this request
-    traces_labelcount: t.List[t.List[int]] = [
-        [counts_per_domain[domain][0] for trace in traces for domain in trace]
-        for traces in loaded_domains.values()
-    ]
+    traces_labelcount: t.List[t.List[int]] = []
     # for each trace count how many traces have this request
-    traces_tracecount: t.List[t.List[int]] = [
-        [counts_per_domain[domain][1] for trace in traces for domain in trace]
-        for traces in loaded_domains.values()
-    ]
+    traces_tracecount: t.List[t.List[int]] = []
+    # Both lists are filled in a single pass over the traces
+    for traces in loaded_domains.values():
+        labelcount = []
+        tracecount = []
+        for trace in traces:
+            for domain in trace:
+                num_labels, num_traces = counts_per_domain[domain]
+                labelcount.append(num_labels)
+                tracecount.append(num_traces)
+        traces_labelcount.append(labelcount)
+        traces_tracecount.append(tracecount)
 
     import IPython
 
@@ -10,6 +10,7 @@ from subprocess import DEVNULL, STDOUT
 
 import tbselenium.common as cm
 from selenium import webdriver
+from selenium.common.exceptions import WebDriverException
 from selenium.webdriver.common.desired_capabilities import DesiredCapabilities
 from selenium.webdriver.firefox.firefox_profile import FirefoxProfile
 from selenium.webdriver.firefox.options import Options
@@ -21,6 +22,31 @@ TBB_DIR = "/opt/tor-browser_en-US"
 
 # Wait this many seconds after every browser event before a browser close can occur
 WEBPAGE_TOTAL_TIME = 20.0
+# After the page load, wait until no new resources were loaded for this many seconds
+# but never longer than `WEBPAGE_SETTLE_TIME` seconds
+WEBPAGE_IDLE_TIME = 0.5
+WEBPAGE_SETTLE_TIME = 5.0
+# Number of resources the page has loaded, or null while the document is still loading
+# or if the browser does not record resource timings, like the Tor Browser
+#
+# The resource timing buffer only holds 250 entries by default, so the resources are
+# counted by a PerformanceObserver, which is notified about all new entries.
+JS_NUM_LOADED_RESOURCES = """
+if (document.readyState != "complete") {
+    return null;
+}
+if (window.numLoadedResources === undefined) {
+    var numResources = performance.getEntriesByType("resource").length;
+    if (numResources == 0) {
+        return null;
+    }
+    new PerformanceObserver(function (list) {
+        window.numLoadedResources += list.getEntries().length;
+    }).observe({ entryTypes: ["resource"] });
+    window.numLoadedResources = numResources;
+}
+return window.numLoadedResources;
+"""
 
 DNSTAP_SOCKET = "/var/run/unbound/dnstap.sock"
 DNSTAP_FILE = "/output/website-log.dnstap"
@@ -98,23 +124,47 @@ def start_webdriver(profile_directory: t.Optional[str] = None) -> t.Any:
 
 
 def handle_url(url: str) -> None:
-    driver_tmp = start_webdriver()
-    driver = start_webdriver(driver_tmp.profile.path)
-    driver_tmp.close()
-    del driver_tmp
+    driver = start_webdriver()
     time.sleep(2)
 
     # Execute before experiment scripts
     before_experiment()
     driver.get(url)
     # Wait some time after the page load to make sure it is really loaded
-    time.sleep(5)
+    wait_until_page_settled(driver)
     driver.save_screenshot("/output/website-log.screenshot.png")
     after_experiment()
 
     driver.close()
 
 
+def wait_until_page_settled(driver: t.Any) -> None:
+    """
+    Wait until the page stops loading new resources
+
+    This takes at least `WEBPAGE_IDLE_TIME` and at most `WEBPAGE_SETTLE_TIME` seconds.
+    Without a resource count, the full `WEBPAGE_SETTLE_TIME` seconds are waited.
+    """
+    start = time.monotonic()
+    last_change = start
+    num_resources = None
+    while True:
+        now = time.monotonic()
+        if now - start >= WEBPAGE_SETTLE_TIME:
+            return
+        try:
+            current = driver.execute_script(JS_NUM_LOADED_RESOURCES)
+        except WebDriverException:
+            # The script can fail while the page navigates, e.g., for JS redirects
+            current = None
+        if current != num_resources:
+            num_resources = current
+            last_change = now
+        elif current is not None and now - last_change >= WEBPAGE_IDLE_TIME:
+            return
+        time.sleep(0.1)
+
+
 def before_experiment() -> None:
     print("Start before experiment")
     start_dns_software()
@@ -163,8 +213,7 @@ def before_experiment() -> None:
         stderr=DEVNULL,
         check=True,
     )
-    with open("/output/website-log.dnstimes.txt", "at") as fout:
-        subprocess.run(["date", "+%s.%N"], stdout=fout, check=True)
+    log_dns_time()
     print("Finished before experiment")
 
 
@@ -172,8 +221,7 @@ def after_experiment() -> None:
     print("Start after experiment")
 
     print("end.example marker query")
-    with open("/output/website-log.dnstimes.txt", "at") as fout:
-        subprocess.run(["date", "+%s.%N"], stdout=fout, check=True)
+    log_dns_time()
     subprocess.run(
         ["dig", "@127.0.0.1", "+tries=1", "A", "end.example."],
         stdout=DEVNULL,
@@ -195,6 +243,15 @@ def after_experiment() -> None:
     print("Finished after experiment")
 
 
+def log_dns_time() -> None:
+    """
+    Append the current time in the format of `date +%s.%N` to the dnstimes file
+    """
+    now = time.time_ns()
+    with open("/output/website-log.dnstimes.txt", "at") as fout:
+        fout.write(f"{now // 1_000_000_000}.{now % 1_000_000_000:09}\n")
+
+
 def start_dns_software() -> None:
     global PROC_STUBBY
 
@@ -204,9 +261,6 @@ def start_dns_software() -> None:
 
 
 def main() -> None:
-    # Monkey patch the tbselenium dependency
-    TorBrowserDriver.__init__ = new_init
-
     parser = argparse.ArgumentParser()
     parser.add_argument(
         "url", metavar="URL", help="URL for which network dependencies should be loaded"
@@ -263,5 +317,9 @@ def new_init(
     time.sleep(1)
 
 
+# Monkey patch the tbselenium dependency
+TorBrowserDriver.__init__ = new_init
+
+
 if __name__ == "__main__":
     main()
@@ -1,13 +1,38 @@
 #!/usr/bin/env python3
 import argparse
-import json
+import collections
+import functools
+import sys
 import typing as t
 from urllib.parse import urlparse
 
 import networkx as nx
 
+try:
+    # ijson parses the log incrementally, such that large logs do not need to fit into
+    # memory, but it is an optional dependency
+    # Only the C backend is used, the pure Python one is much slower than a full parse
+    import ijson.backends.yajl2_c as ijson
+except ImportError:
+    ijson = None
+
+try:
+    # orjson parses large websocket logs much faster, but it is an optional dependency
+    from orjson import loads as json_loads
+except ImportError:
+    from json import loads as json_loads
+
+
+@functools.lru_cache(maxsize=None)
+def hostname(url: str) -> t.Optional[str]:
+    # Resources and node names are derived from the same URLs, so parse each URL once
+    return urlparse(url).hostname
+
 
 class Resource:
+    # Resources are hashed and compared by identity, the slots keep them small
+    __slots__ = ("name", "dnsname", "index", "_depends_on")
+
     def __init__(self, name: str, index: int, **kwargs: t.Dict[t.Any, t.Any]) -> None:
         self.name = name
         self.dnsname = Resource._sanitize_name(name)
@@ -24,10 +49,12 @@ class Resource:
         elif name == "other":
             return "other"
 
-        tmp = urlparse(name).hostname
+        tmp = hostname(name)
         if not tmp:
             print("-> " + name)
-        return tmp
+            return tmp
+        # Many resources share a DNS name, interning lets them compare by identity
+        return sys.intern(tmp)
 
     def add_dependency(self, on: "Resource") -> None:
         if self == on:
@@ -64,72 +91,153 @@ class ResourceDependenciesFactory:
         for resource in self._resource_cache.values():
             for other in resource.get_dependencies():
                 graph.add_edge(resource, other)
-        graph = nx.transitive_closure(graph)
 
-        print(len(graph.nodes()), len(graph.edges()))
+        # The simplification patches the successor and predecessor sets of the
+        # transitive closure, a networkx graph is only built for the simplified result
+        # `successors` keeps the order of the graph nodes
+        successors = transitive_closure(graph)
+        predecessors: t.Dict[Resource, t.Set[Resource]] = {
+            node: set() for node in successors
+        }
+        for node, succs in successors.items():
+            for succ in succs:
+                predecessors[succ].add(node)
+
+        def print_size() -> None:
+            print(len(successors), sum(len(succs) for succs in successors.values()))
+
+        def remove_node(node: Resource) -> None:
+            for pred in predecessors.pop(node):
+                successors[pred].discard(node)
+            for succ in successors.pop(node):
+                predecessors[succ].discard(node)
+
+        print_size()
+
+        def simplify_graph(dirty: t.Set[Resource]) -> t.Set[Resource]:
+            """
+            Run both simplifications once over the graph
+
+            Only nodes whose successors changed since they were last checked can be
+            simplified further. These are the nodes in `dirty` and the nodes changed
+            during this run. Returns the nodes whose successors changed.
+            """
+            changed: t.Set[Resource] = set()
+
+            def needs_check(node: Resource) -> bool:
+                return node in dirty or node in changed
 
-        def simplify_graph(graph: nx.DiGraph) -> None:
             print("-------------------------------\nfirst simplify")
             # Remove all nodes which depend on a node with identical DNS name
             # the second one would never cause a new DNS lookup
-            for node in graph.nodes():
+            for node in list(successors):
                 if node.name == "https://www.redditstatic.com/droparrowgray.gif":
-                    print(node, len(graph.successors(node)))
-                for succ in graph.successors_iter(node):
+                    print(node, len(successors[node]))
+                if not needs_check(node):
+                    continue
+                for succ in successors[node]:
                     if node.dnsname == succ.dnsname:
                         # No need to copy the edges as we already have computed the transitive closure
-                        graph.remove_node(node)
+                        changed.update(predecessors[node])
+                        remove_node(node)
                         break
-            print(len(graph.nodes()), len(graph.edges()))
+            print_size()
 
             print("-------------------------------\nsecond simplify")
             # TODO generalize to subset relationship between the dependencies
             # based on the transitive closure of the dependencies
-            nodes = graph.nodes()
-            for i in range(len(nodes) - 1):
-                node = nodes[i]
+            nodes = list(successors)
+            # Only nodes with the same DNS name can be merged, so group them by DNS name
+            # Each bucket keeps the order of `nodes`
+            buckets: t.Dict[str, t.List[Resource]] = collections.defaultdict(list)
+            for node in nodes:
+                buckets[node.dnsname].append(node)
+            for node in nodes:
+                bucket = buckets[node.dnsname]
+                # All nodes in front of `node` have been handled already
+                del bucket[0]
                 # search for two unrelated nodes with same DNS name and same dependencies
                 # same DNS name and same dependencies (by DNS name) are actually the same node
-                for other in nodes[i + 1 :]:
-                    if node.dnsname != other.dnsname:
+                for other in bucket:
+                    # Both nodes were already compared, and their successors differed
+                    if not (needs_check(node) or needs_check(other)):
                         continue
 
                     # There are different possibilities here
                     #
                     # Equal dependencies is the easy case.
-                    if graph.successors(node) != graph.successors(other):
+                    if successors[node] != successors[other]:
                         continue
 
-                    for pred in graph.predecessors(node):
-                        graph.add_edge(pred, other)
-                    graph.remove_node(node)
+                    for pred in predecessors[node]:
+                        successors[pred].add(other)
+                        predecessors[other].add(pred)
+                        changed.add(pred)
+                    remove_node(node)
                     break
 
-            print(len(graph.nodes()), len(graph.edges()))
+            print_size()
+            return changed
 
-        size = (len(graph.nodes()), len(graph.edges()))
-        newsize = (0, 0)
-        while size != newsize:
-            size = (len(graph.nodes()), len(graph.edges()))
-            simplify_graph(graph)
-            newsize = (len(graph.nodes()), len(graph.edges()))
+        # Repeat until no successors change anymore, initially all nodes need a check
+        dirty = set(successors)
+        while dirty:
+            dirty = simplify_graph(dirty)
 
-        print("Names with multiple nodes:")
-        import collections
+        graph = nx.DiGraph()
+        graph.add_nodes_from(
+            (node, {"label": node.dnsname, "fullname": node.name, "index": node.index})
+            for node in successors
+        )
+        for node, succs in successors.items():
+            # Sort the successors to get a deterministic edge order
+            graph.add_edges_from(
+                (node, succ) for succ in sorted(succs, key=lambda res: res.index)
+            )
 
+        print("Names with multiple nodes:")
         c = collections.Counter(node.dnsname for node in graph.nodes_iter())
         for name, count in c.most_common():
             if count > 1:
                 print("  ", name, count)
 
-        for node in graph.nodes():
-            graph.node[node]["label"] = node.dnsname
-            graph.node[node]["fullname"] = node.name
-            graph.node[node]["index"] = str(node.index)
-            graph.node[node]["deps"] = repr(node.get_dependencies())
         nx.write_graphml(graph, "graph.graphml", encoding="utf-8", prettyprint=True)
 
 
+def transitive_closure(graph: nx.DiGraph) -> t.Dict[Resource, t.Set[Resource]]:
+    """
+    Compute the transitive closure of `graph` without any self-loops
+
+    Returns the set of reachable nodes for every node, in the order of the graph nodes.
+    The graph is condensed into its strongly connected components, such that the nodes
+    reachable from each component can be computed bottom-up in reverse topological
+    order, reusing the results of the successors.
+    """
+    # networkx 1.x fails to condense an empty graph
+    if graph.number_of_nodes() == 0:
+        return {}
+
+    condensed = nx.condensation(graph)
+    mapping = condensed.graph["mapping"]
+    # For each component, all nodes reachable from it, excluding its own members
+    reachable: t.Dict[int, t.Set[Resource]] = dict()
+    for component in reversed(nx.topological_sort(condensed)):
+        reach: t.Set[Resource] = set()
+        for succ in condensed.successors_iter(component):
+            reach.update(condensed.node[succ]["members"])
+            reach.update(reachable[succ])
+        reachable[component] = reach
+
+    closure: t.Dict[Resource, t.Set[Resource]] = dict()
+    for node in graph.nodes_iter():
+        component = mapping[node]
+        # Members of the same component reach each other over a cycle
+        others = reachable[component].union(condensed.node[component]["members"])
+        others.discard(node)
+        closure[node] = others
+    return closure
+
+
 FACTORY: ResourceDependenciesFactory = ResourceDependenciesFactory()
 
 
@@ -139,7 +247,7 @@ def node_sanitize_name(name: str) -> str:
     elif name == "other":
         return '"other"'
 
-    name = urlparse(name).hostname
+    name = hostname(name)
     # name = name.replace("https://", "").replace("http://", "")[:100]
     return f'"{name}"'
 
@@ -152,8 +260,12 @@ def resource_depends_on(resource: str, dependency: str) -> None:
     FACTORY.create_dependency(resource, dependency)
 
 
-def parse_file(log: t.IO[str]) -> None:
-    data = json.load(log)
+def parse_file(log: t.IO[bytes]) -> None:
+    data: t.Iterable[t.Dict[str, t.Any]]
+    if ijson is not None:
+        data = ijson.items(log, "item")
+    else:
+        data = json_loads(log.read())
 
     for elem in data:
         if elem["method"] != "Network.requestWillBeSent":
@@ -179,18 +291,27 @@ def add_dependencies_from_initiator(
 
 
 def add_dependencies_from_stack(resource: str, stack: t.Dict[str, t.Any]) -> None:
-    for frame in stack["callFrames"]:
-        resource_depends_on(resource, frame["url"])
+    # The same script often occurs in many frames, so only add every URL once
+    # The dict keeps the URLs in the order in which they were first seen
+    urls: t.Dict[str, None] = dict()
+    current: t.Optional[t.Dict[str, t.Any]] = stack
+    while current is not None:
+        urls.update((frame["url"], None) for frame in current["callFrames"])
+        current = current.get("parent")
 
-    if "parent" in stack:
-        add_dependencies_from_stack(resource, stack["parent"])
+    for url in urls:
+        resource_depends_on(resource, url)
 
 
 def main() -> None:
     global GRAPH, FACTORY  # pylint: disable=W0603
     parser = argparse.ArgumentParser()
     parser.add_argument(
-        "-f", "--file", type=open, required=True, help="Log file to parse"
+        "-f",
+        "--file",
+        type=argparse.FileType("rb"),
+        required=True,
+        help="Log file to parse",
     )
     args = parser.parse_args()
 